@@ -10,6 +10,9 @@ IMAGE_NAME="langsmith-mcp"
 TAG="latest"
 CONTAINER_NAME="langsmith-mcp-server"
 
+# The API key is only ever read from the environment
+: "${LANGSMITH_API_KEY:?LANGSMITH_API_KEY must be set}"
+
 echo "🐳 Building LangSmith MCP Docker image..."
 
 # Build the Docker image
@@ -30,7 +33,7 @@ echo "🚀 Starting LangSmith MCP container..."
 docker run -d \
     --name ${CONTAINER_NAME} \
     --restart unless-stopped \
-    -e LANGSMITH_API_KEY="${LANGSMITH_API_KEY:-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}" \
+    -e LANGSMITH_API_KEY="${LANGSMITH_API_KEY}" \
     -e LANGSMITH_PROJECT="sapience" \
     -e LANGSMITH_ENDPOINT="https://api.smith.langchain.com" \
     -e SAP_COMPANY_CODES="1000,2000,3000" \
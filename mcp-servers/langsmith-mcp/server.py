@@ -5,22 +5,30 @@ Enables Claude to interact directly with LangSmith for SAPience project
 """
 
 import asyncio
-import json
 import logging
+import os
+import secrets
+import uuid
 from typing import Any, Dict, List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
+
+import orjson
+from jsonschema import Draft7Validator
+from jsonschema.exceptions import best_match
 
 from mcp.server import Server, NotificationOptions
 from mcp.server.models import InitializationOptions
 import mcp.server.stdio
 import mcp.types as types
 
-from langsmith import Client
+from langsmith import AsyncClient
 from langsmith.evaluation import evaluate
 from langsmith.schemas import Run, Example
 
-# Initialize LangSmith client
-langsmith_client = Client()
+LANGSMITH_PROJECT = os.getenv("LANGSMITH_PROJECT", "sapience")
+
+# Initialize LangSmith client (async, so tool calls never block the event loop)
+langsmith_client = AsyncClient()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -28,169 +36,179 @@ logger = logging.getLogger("langsmith-mcp")
 
 server = Server("langsmith-mcp")
 
-@server.list_tools()
-async def handle_list_tools() -> List[types.Tool]:
-    """List available LangSmith tools for Claude."""
-    return [
-        types.Tool(
-            name="trace_sapience_workflow",
-            description="Trace a SAPience ML workflow execution",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "workflow_name": {
-                        "type": "string",
-                        "description": "Name of the workflow (monthly_forecast, anomaly_detection, etc.)"
-                    },
-                    "session_id": {
-                        "type": "string", 
-                        "description": "Session ID for grouping related traces"
-                    },
-                    "metadata": {
-                        "type": "object",
-                        "description": "Additional metadata (company_code, period, etc.)"
-                    }
+# Tool definitions are static, so build them (and their validators) once at import
+_TOOLS: List[types.Tool] = [
+    types.Tool(
+        name="trace_sapience_workflow",
+        description="Trace a SAPience ML workflow execution",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "workflow_name": {
+                    "type": "string",
+                    "description": "Name of the workflow (monthly_forecast, anomaly_detection, etc.)"
                 },
-                "required": ["workflow_name"]
-            }
-        ),
-        types.Tool(
-            name="evaluate_ml_predictions",
-            description="Evaluate ML model performance using LangSmith",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "model_name": {
-                        "type": "string",
-                        "description": "ML model name (pup_predictor, anomaly_detector, etc.)"
-                    },
-                    "dataset_name": {
-                        "type": "string",
-                        "description": "Evaluation dataset name"
-                    },
-                    "metrics": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Metrics to evaluate (mape, rmse, f1_score, etc.)"
-                    }
+                "session_id": {
+                    "type": "string", 
+                    "description": "Session ID for grouping related traces"
                 },
-                "required": ["model_name", "dataset_name"]
-            }
-        ),
-        types.Tool(
-            name="optimize_claude_prompts",
-            description="Optimize Claude prompts for SAP analysis using LangSmith",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "prompt_template": {
-                        "type": "string",
-                        "description": "Current prompt template to optimize"
-                    },
-                    "use_case": {
-                        "type": "string",
-                        "description": "Use case (anomaly_explanation, forecast_summary, etc.)"
-                    },
-                    "test_examples": {
-                        "type": "array",
-                        "description": "Test examples for evaluation"
-                    }
+                "metadata": {
+                    "type": "object",
+                    "description": "Additional metadata (company_code, period, etc.)"
+                }
+            },
+            "required": ["workflow_name"]
+        }
+    ),
+    types.Tool(
+        name="evaluate_ml_predictions",
+        description="Evaluate ML model performance using LangSmith",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "model_name": {
+                    "type": "string",
+                    "description": "ML model name (pup_predictor, anomaly_detector, etc.)"
                 },
-                "required": ["prompt_template", "use_case"]
-            }
-        ),
-        types.Tool(
-            name="create_sap_dataset",
-            description="Create LangSmith dataset from SAP data for ML evaluation",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "dataset_name": {
-                        "type": "string",
-                        "description": "Name for the new dataset"
-                    },
-                    "sap_data_source": {
-                        "type": "string",
-                        "description": "SAP data source (ACDOCA, MBEW, CKML, etc.)"
-                    },
-                    "company_codes": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Company codes to include"
-                    },
-                    "period_range": {
-                        "type": "object",
-                        "description": "Date range for data extraction"
-                    }
+                "dataset_name": {
+                    "type": "string",
+                    "description": "Evaluation dataset name"
                 },
-                "required": ["dataset_name", "sap_data_source"]
-            }
-        ),
-        types.Tool(
-            name="monitor_sapience_performance",
-            description="Monitor real-time performance of SAPience ML pipelines",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "time_range": {
-                        "type": "string",
-                        "description": "Time range for monitoring (1h, 24h, 7d, 30d)"
-                    },
-                    "components": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Components to monitor (ml_models, claude_copilot, n8n_workflows)"
-                    }
+                "metrics": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Metrics to evaluate (mape, rmse, f1_score, etc.)"
+                }
+            },
+            "required": ["model_name", "dataset_name"]
+        }
+    ),
+    types.Tool(
+        name="optimize_claude_prompts",
+        description="Optimize Claude prompts for SAP analysis using LangSmith",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "prompt_template": {
+                    "type": "string",
+                    "description": "Current prompt template to optimize"
                 },
-                "required": ["time_range"]
-            }
-        ),
-        types.Tool(
-            name="generate_langsmith_report",
-            description="Generate comprehensive LangSmith analytics report for SAPience",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "report_type": {
-                        "type": "string",
-                        "enum": ["performance", "quality", "usage", "comprehensive"],
-                        "description": "Type of report to generate"
-                    },
-                    "period": {
-                        "type": "string",
-                        "description": "Reporting period (weekly, monthly, quarterly)"
-                    },
-                    "include_recommendations": {
-                        "type": "boolean",
-                        "description": "Include AI-powered recommendations"
-                    }
+                "use_case": {
+                    "type": "string",
+                    "description": "Use case (anomaly_explanation, forecast_summary, etc.)"
                 },
-                "required": ["report_type"]
-            }
-        )
-    ]
+                "test_examples": {
+                    "type": "array",
+                    "description": "Test examples for evaluation"
+                }
+            },
+            "required": ["prompt_template", "use_case"]
+        }
+    ),
+    types.Tool(
+        name="create_sap_dataset",
+        description="Create LangSmith dataset from SAP data for ML evaluation",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "dataset_name": {
+                    "type": "string",
+                    "description": "Name for the new dataset"
+                },
+                "sap_data_source": {
+                    "type": "string",
+                    "description": "SAP data source (ACDOCA, MBEW, CKML, etc.)"
+                },
+                "company_codes": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Company codes to include"
+                },
+                "period_range": {
+                    "type": "object",
+                    "description": "Date range for data extraction"
+                }
+            },
+            "required": ["dataset_name", "sap_data_source"]
+        }
+    ),
+    types.Tool(
+        name="monitor_sapience_performance",
+        description="Monitor real-time performance of SAPience ML pipelines",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "time_range": {
+                    "type": "string",
+                    "description": "Time range for monitoring (1h, 24h, 7d, 30d)"
+                },
+                "components": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Components to monitor (ml_models, claude_copilot, n8n_workflows)"
+                }
+            },
+            "required": ["time_range"]
+        }
+    ),
+    types.Tool(
+        name="generate_langsmith_report",
+        description="Generate comprehensive LangSmith analytics report for SAPience",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "report_type": {
+                    "type": "string",
+                    "enum": ["performance", "quality", "usage", "comprehensive"],
+                    "description": "Type of report to generate"
+                },
+                "period": {
+                    "type": "string",
+                    "description": "Reporting period (weekly, monthly, quarterly)"
+                },
+                "include_recommendations": {
+                    "type": "boolean",
+                    "description": "Include AI-powered recommendations"
+                }
+            },
+            "required": ["report_type"]
+        }
+    )
+]
+
+# Compiled once per tool; the framework's own per-call validation is disabled below
+_VALIDATORS: Dict[str, Draft7Validator] = {
+    tool.name: Draft7Validator(tool.inputSchema) for tool in _TOOLS
+}
+
+@server.list_tools()
+async def handle_list_tools() -> List[types.Tool]:
+    """List available LangSmith tools for Claude."""
+    return _TOOLS
 
-@server.call_tool()
+def validate_arguments(name: str, arguments: Dict[str, Any]) -> None:
+    """Validate tool arguments against the tool's inputSchema."""
+    validator = _VALIDATORS.get(name)
+    if validator is None:
+        return
+    
+    error = best_match(validator.iter_errors(arguments))
+    if error is not None:
+        raise ValueError(f"Invalid arguments for {name}: {error.message}")
+
+@server.call_tool(validate_input=False)
 async def handle_call_tool(
     name: str, arguments: Dict[str, Any]
 ) -> List[types.TextContent]:
     """Handle tool calls from Claude."""
     
     try:
-        if name == "trace_sapience_workflow":
-            return await trace_sapience_workflow(arguments)
-        elif name == "evaluate_ml_predictions":
-            return await evaluate_ml_predictions(arguments)
-        elif name == "optimize_claude_prompts":
-            return await optimize_claude_prompts(arguments)
-        elif name == "create_sap_dataset":
-            return await create_sap_dataset(arguments)
-        elif name == "monitor_sapience_performance":
-            return await monitor_sapience_performance(arguments)
-        elif name == "generate_langsmith_report":
-            return await generate_langsmith_report(arguments)
-        else:
+        validate_arguments(name, arguments)
+        
+        handler = _DISPATCH.get(name)
+        if handler is None:
             raise ValueError(f"Unknown tool: {name}")
+        return await handler(arguments)
             
     except Exception as e:
         logger.error(f"Error in {name}: {str(e)}")
@@ -202,24 +220,31 @@ async def handle_call_tool(
 async def trace_sapience_workflow(args: Dict[str, Any]) -> List[types.TextContent]:
     """Trace SAPience workflow execution."""
     workflow_name = args["workflow_name"]
-    session_id = args.get("session_id", f"session_{datetime.now().isoformat()}")
+    now = datetime.now(timezone.utc)
+    session_id = args["session_id"] if "session_id" in args else f"session_{secrets.token_hex(8)}"
     metadata = args.get("metadata", {})
     
     # Create trace session
-    trace_url = f"https://smith.langchain.com/projects/sapience/sessions/{session_id}"
+    trace_url = f"https://smith.langchain.com/projects/{LANGSMITH_PROJECT}/sessions/{session_id}"
     
     # Start tracing workflow
-    with langsmith_client.trace(
+    run_id = uuid.uuid4()
+    await langsmith_client.create_run(
         name=workflow_name,
-        session_id=session_id,
-        metadata=metadata
-    ) as trace:
-        trace.log_metadata({
+        inputs={"metadata": metadata},
+        run_type="chain",
+        project_name=LANGSMITH_PROJECT,
+        id=run_id,
+        start_time=now,
+        end_time=now,
+        extra={"metadata": {
             "platform": "sapience",
             "component": workflow_name,
-            "timestamp": datetime.now().isoformat(),
+            "session_id": session_id,
+            "timestamp": now.isoformat(),
             **metadata
-        })
+        }}
+    )
     
     return [types.TextContent(
         type="text",
@@ -228,7 +253,7 @@ async def trace_sapience_workflow(args: Dict[str, Any]) -> List[types.TextConten
 📊 **Trace Details:**
 - Session ID: {session_id}
 - Workflow: {workflow_name}
-- Metadata: {json.dumps(metadata, indent=2)}
+- Metadata: {orjson.dumps(metadata, option=orjson.OPT_INDENT_2).decode()}
 - Trace URL: {trace_url}
 
 🔍 **Next Steps:**
@@ -344,22 +369,28 @@ async def monitor_sapience_performance(args: Dict[str, Any]) -> List[types.TextC
     
     monitoring_data = await get_performance_metrics(time_range, components)
     
-    return [types.TextContent(
-        type="text",
-        text=f"""📊 **SAPience Performance Monitor** ({time_range})
-
-{format_performance_dashboard(monitoring_data)}
-
-**🚨 Alerts:**
-{format_performance_alerts(monitoring_data['alerts'])}
-
-**📈 Trends:**
-{format_performance_trends(monitoring_data['trends'])}
-
-**🎯 Recommendations:**
-{format_performance_recommendations(monitoring_data)}
-"""
-    )]
+    return [
+        types.TextContent(
+            type="text",
+            text=f"📊 **SAPience Performance Monitor** ({time_range})\n"
+        ),
+        types.TextContent(
+            type="text",
+            text=format_performance_dashboard(monitoring_data)
+        ),
+        types.TextContent(
+            type="text",
+            text=f"**🚨 Alerts:**\n{format_performance_alerts(monitoring_data['alerts'])}\n"
+        ),
+        types.TextContent(
+            type="text",
+            text=f"**📈 Trends:**\n{format_performance_trends(monitoring_data['trends'])}\n"
+        ),
+        types.TextContent(
+            type="text",
+            text=f"**🎯 Recommendations:**\n{format_performance_recommendations(monitoring_data)}\n"
+        )
+    ]
 
 async def generate_langsmith_report(args: Dict[str, Any]) -> List[types.TextContent]:
     """Generate comprehensive LangSmith report."""
@@ -369,18 +400,34 @@ async def generate_langsmith_report(args: Dict[str, Any]) -> List[types.TextCont
     
     report_data = await generate_analytics_report(report_type, period)
     
-    return [types.TextContent(
-        type="text",
-        text=f"""📋 **SAPience Analytics Report** ({report_type.title()} - {period.title()})
-
-{format_analytics_report(report_data, include_recommendations)}
-
-📊 **Executive Summary:**
+    return [
+        types.TextContent(
+            type="text",
+            text=f"📋 **SAPience Analytics Report** ({report_type.title()} - {period.title()})\n"
+        ),
+        types.TextContent(
+            type="text",
+            text=format_analytics_report(report_data, include_recommendations)
+        ),
+        types.TextContent(
+            type="text",
+            text=f"""📊 **Executive Summary:**
 {report_data['executive_summary']}
 
 🔗 **Full Report:** https://smith.langchain.com/projects/sapience/reports/{report_data['report_id']}
 """
-    )]
+        )
+    ]
+
+# Tool name -> handler, consulted by handle_call_tool
+_DISPATCH = {
+    "trace_sapience_workflow": trace_sapience_workflow,
+    "evaluate_ml_predictions": evaluate_ml_predictions,
+    "optimize_claude_prompts": optimize_claude_prompts,
+    "create_sap_dataset": create_sap_dataset,
+    "monitor_sapience_performance": monitor_sapience_performance,
+    "generate_langsmith_report": generate_langsmith_report,
+}
 
 # Helper functions (implementation would be more detailed)
 async def run_model_evaluation(model_name: str, dataset_name: str, metrics: List[str]) -> Dict:
@@ -417,19 +464,22 @@ def format_analytics_report(data: Dict, include_recommendations: bool) -> str:
 
 async def main():
     """Main entry point for the MCP server."""
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="langsmith-mcp",
-                server_version="1.0.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+    try:
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="langsmith-mcp",
+                    server_version="1.0.0",
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    ),
                 ),
-            ),
-        )
+            )
+    finally:
+        await langsmith_client.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
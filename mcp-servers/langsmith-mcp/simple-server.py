@@ -5,31 +5,99 @@ Minimal dependencies version
 """
 
 import asyncio
-import json
+import logging
 import sys
 import os
+import secrets
+import stat
+import uuid
 from typing import Any, Dict, List
-from datetime import datetime
+from datetime import datetime, timezone
+
+import orjson
+
+# stdout carries JSON-RPC frames, so all diagnostics go to stderr
+logging.basicConfig(stream=sys.stderr, level=os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger("langsmith-mcp")
 
 try:
-    from langsmith import Client
+    from langsmith import AsyncClient
     LANGSMITH_AVAILABLE = True
 except ImportError:
     LANGSMITH_AVAILABLE = False
-    print("Warning: LangSmith not available. Install with: python -m pip install langsmith")
+    logger.warning("LangSmith not available. Install with: python -m pip install langsmith")
+
+# Runs are uploaded in the background, up to this many per batch or after this wait
+RUN_BATCH_SIZE = int(os.getenv("LANGSMITH_BATCH_SIZE", "100"))
+RUN_BATCH_WAIT = 0.05
+# Runs waiting for upload are capped so a slow LangSmith can't grow memory unbounded
+RUN_QUEUE_SIZE = RUN_BATCH_SIZE * 10
+# How long shutdown waits for queued runs to upload before dropping them
+RUN_FLUSH_TIMEOUT = float(os.getenv("LANGSMITH_FLUSH_TIMEOUT", "5"))
 
 class SimpleLangSmithMCP:
     def __init__(self):
         self.api_key = os.getenv("LANGSMITH_API_KEY")
         self.project = os.getenv("LANGSMITH_PROJECT", "sapience")
         self.client = None
-        
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=RUN_QUEUE_SIZE)
+        self._uploader = None
+    
+    async def __aenter__(self):
+        """Open the LangSmith client; its connection pool lives until __aexit__."""
         if LANGSMITH_AVAILABLE and self.api_key:
             try:
-                self.client = Client(api_key=self.api_key)
-                print(f"✅ LangSmith connected to project: {self.project}")
+                self.client = AsyncClient(api_key=self.api_key)
+                self._uploader = asyncio.create_task(self._upload_runs())
+                logger.info(f"✅ LangSmith connected to project: {self.project}")
             except Exception as e:
-                print(f"❌ LangSmith connection failed: {e}")
+                logger.error(f"❌ LangSmith connection failed: {e}")
+        return self
+    
+    async def __aexit__(self, *exc):
+        if self._uploader:
+            # Flush whatever is still queued before closing the connection pool,
+            # but don't let an unreachable LangSmith hold up shutdown
+            try:
+                await asyncio.wait_for(self._queue.join(), RUN_FLUSH_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"Dropped {self._queue.qsize()} queued runs not uploaded "
+                    f"within {RUN_FLUSH_TIMEOUT}s"
+                )
+            self._uploader.cancel()
+            try:
+                await self._uploader
+            except asyncio.CancelledError:
+                pass
+            self._uploader = None
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+    
+    async def _upload_runs(self):
+        """Drain queued runs and upload them to LangSmith in batches."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + RUN_BATCH_WAIT
+            while len(batch) < RUN_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            results = await asyncio.gather(
+                *(self.client.create_run(**run) for run in batch),
+                return_exceptions=True
+            )
+            for run, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error uploading run {run['id']}: {result}")
+                self._queue.task_done()
     
     async def trace_workflow(self, workflow_name: str, metadata: Dict = None):
         """Trace a SAPience workflow."""
@@ -37,23 +105,28 @@ class SimpleLangSmithMCP:
             return {"error": "LangSmith not available"}
         
         try:
-            session_id = f"sapience_{workflow_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            session_id = f"sapience_{workflow_name}_{secrets.token_hex(8)}"
             
             # Create trace
-            run = self.client.create_run(
+            run_id = uuid.uuid4()
+            self._queue.put_nowait(dict(
                 name=workflow_name,
-                session_id=session_id,
                 project_name=self.project,
                 inputs={"metadata": metadata or {}},
-                run_type="chain"
-            )
+                run_type="chain",
+                id=run_id,
+                start_time=datetime.now(timezone.utc),
+                extra={"metadata": {"session_id": session_id}}
+            ))
             
             return {
                 "success": True,
                 "session_id": session_id,
-                "run_id": str(run.id),
-                "trace_url": f"https://smith.langchain.com/projects/{self.project}/runs/{run.id}"
+                "run_id": str(run_id),
+                "trace_url": f"https://smith.langchain.com/projects/{self.project}/runs/{run_id}"
             }
+        except asyncio.QueueFull:
+            return {"error": "LangSmith upload queue is full, run not recorded"}
         except Exception as e:
             return {"error": str(e)}
     
@@ -63,27 +136,74 @@ class SimpleLangSmithMCP:
             return {"error": "LangSmith not available"}
         
         try:
-            run = self.client.create_run(
+            run_id = uuid.uuid4()
+            now = datetime.now(timezone.utc)
+            self._queue.put_nowait(dict(
                 name=f"ml_prediction_{model_name}",
                 project_name=self.project,
                 inputs={"model": model_name, "metadata": metadata or {}},
                 outputs={"prediction": prediction},
-                run_type="llm"
-            )
+                run_type="llm",
+                id=run_id,
+                start_time=now,
+                end_time=now
+            ))
             
             return {
                 "success": True,
-                "run_id": str(run.id),
-                "logged_at": datetime.now().isoformat()
+                "run_id": str(run_id),
+                "logged_at": now.isoformat()
             }
+        except asyncio.QueueFull:
+            return {"error": "LangSmith upload queue is full, prediction not recorded"}
         except Exception as e:
             return {"error": str(e)}
 
+# Tool definitions are static, so build them once at import
+_TOOLS: List[Dict] = [
+    {
+        "name": "trace_sapience_workflow",
+        "description": "Trace a SAPience ML workflow",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "workflow_name": {"type": "string"},
+                "metadata": {"type": "object"}
+            },
+            "required": ["workflow_name"]
+        }
+    },
+    {
+        "name": "log_ml_prediction",
+        "description": "Log ML prediction results",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "model_name": {"type": "string"},
+                "prediction": {"type": "object"},
+                "metadata": {"type": "object"}
+            },
+            "required": ["model_name", "prediction"]
+        }
+    }
+]
+
+# Tool name -> coroutine factory taking (server, arguments)
+_DISPATCH = {
+    "trace_sapience_workflow": lambda mcp, arguments: mcp.trace_workflow(
+        arguments.get("workflow_name"),
+        arguments.get("metadata")
+    ),
+    "log_ml_prediction": lambda mcp, arguments: mcp.log_prediction(
+        arguments.get("model_name"),
+        arguments.get("prediction"),
+        arguments.get("metadata")
+    ),
+}
+
 # Simple MCP protocol handler
-async def handle_mcp_message(message: Dict) -> Dict:
+async def handle_mcp_message(mcp: SimpleLangSmithMCP, message: Dict) -> Dict:
     """Handle MCP protocol messages."""
-    mcp = SimpleLangSmithMCP()
-    
     method = message.get("method")
     params = message.get("params", {})
     
@@ -92,33 +212,7 @@ async def handle_mcp_message(message: Dict) -> Dict:
             "jsonrpc": "2.0",
             "id": message.get("id"),
             "result": {
-                "tools": [
-                    {
-                        "name": "trace_sapience_workflow",
-                        "description": "Trace a SAPience ML workflow",
-                        "inputSchema": {
-                            "type": "object",
-                            "properties": {
-                                "workflow_name": {"type": "string"},
-                                "metadata": {"type": "object"}
-                            },
-                            "required": ["workflow_name"]
-                        }
-                    },
-                    {
-                        "name": "log_ml_prediction",
-                        "description": "Log ML prediction results",
-                        "inputSchema": {
-                            "type": "object",
-                            "properties": {
-                                "model_name": {"type": "string"},
-                                "prediction": {"type": "object"},
-                                "metadata": {"type": "object"}
-                            },
-                            "required": ["model_name", "prediction"]
-                        }
-                    }
-                ]
+                "tools": _TOOLS
             }
         }
     
@@ -126,24 +220,16 @@ async def handle_mcp_message(message: Dict) -> Dict:
         tool_name = params.get("name")
         arguments = params.get("arguments", {})
         
-        if tool_name == "trace_sapience_workflow":
-            result = await mcp.trace_workflow(
-                arguments.get("workflow_name"),
-                arguments.get("metadata")
-            )
-        elif tool_name == "log_ml_prediction":
-            result = await mcp.log_prediction(
-                arguments.get("model_name"),
-                arguments.get("prediction"),
-                arguments.get("metadata")
-            )
-        else:
+        handler = _DISPATCH.get(tool_name)
+        if handler is None:
             result = {"error": f"Unknown tool: {tool_name}"}
+        else:
+            result = await handler(mcp, arguments)
         
         return {
             "jsonrpc": "2.0",
             "id": message.get("id"),
-            "result": {"content": [{"type": "text", "text": json.dumps(result, indent=2)}]}
+            "result": {"content": [{"type": "text", "text": orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()}]}
         }
     
     return {
@@ -152,35 +238,98 @@ async def handle_mcp_message(message: Dict) -> Dict:
         "error": {"code": -32601, "message": f"Unknown method: {method}"}
     }
 
+# JSON-RPC frames are newline-delimited, so allow large single-line payloads
+_STDIN_LIMIT = 16 * 1024 * 1024
+
+# Maximum number of messages being handled concurrently
+MAX_IN_FLIGHT = int(os.getenv("MCP_MAX_IN_FLIGHT", "32"))
+
+def _stdin_is_pipe() -> bool:
+    """True when stdin is a FIFO or socket rather than a TTY or regular file."""
+    try:
+        mode = os.fstat(sys.stdin.fileno()).st_mode
+    except (AttributeError, ValueError, OSError):
+        return False
+    return stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode)
+
+async def open_stdin_reader():
+    """Return an async readline for stdin.
+
+    Uses a native pipe stream when stdin is a pipe or socket, falling back
+    to a thread-pool readline otherwise. A TTY is deliberately excluded:
+    connect_read_pipe makes the file description non-blocking, and when it
+    is shared with stdout the synchronous response writes could then fail.
+    """
+    loop = asyncio.get_running_loop()
+    
+    async def readline():
+        return await loop.run_in_executor(None, sys.stdin.readline)
+    
+    if not _stdin_is_pipe():
+        return readline
+    
+    reader = asyncio.StreamReader(limit=_STDIN_LIMIT)
+    protocol = asyncio.StreamReaderProtocol(reader)
+    try:
+        await loop.connect_read_pipe(lambda: protocol, sys.stdin)
+    except (NotImplementedError, ValueError, OSError):
+        return readline
+    return reader.readline
+
+async def process_message(mcp: SimpleLangSmithMCP, message: Dict):
+    """Handle one message and write its response.
+
+    The write is synchronous, so responses from concurrent tasks never
+    interleave on stdout.
+    """
+    try:
+        response = await handle_mcp_message(mcp, message)
+        sys.stdout.buffer.write(orjson.dumps(response) + b"\n")
+        sys.stdout.buffer.flush()
+    except Exception as e:
+        logger.error(f"Error: {e}")
+
 async def main():
     """Main MCP server loop."""
-    print("🚀 Starting Simple LangSmith MCP Server...")
+    logger.info("🚀 Starting Simple LangSmith MCP Server...")
     
-    # Test LangSmith connection
-    mcp = SimpleLangSmithMCP()
-    if mcp.client:
-        print("✅ LangSmith connection successful!")
-    else:
-        print("⚠️  LangSmith not connected - check LANGSMITH_API_KEY")
-    
-    # Simple stdin/stdout MCP protocol
-    while True:
-        try:
-            line = await asyncio.get_event_loop().run_in_executor(None, sys.stdin.readline)
-            if not line:
-                break
-            
+    async with SimpleLangSmithMCP() as mcp:
+        # Test LangSmith connection
+        if mcp.client:
+            logger.info("✅ LangSmith connection successful!")
+        else:
+            logger.warning("⚠️  LangSmith not connected - check LANGSMITH_API_KEY")
+        
+        # Simple stdin/stdout MCP protocol; each message runs as its own task
+        # so a slow LangSmith call doesn't hold up the messages behind it
+        readline = await open_stdin_reader()
+        in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+        tasks = set()
+        while True:
             try:
-                message = json.loads(line.strip())
-                response = await handle_mcp_message(message)
-                print(json.dumps(response), flush=True)
-            except json.JSONDecodeError:
-                continue
+                line = await readline()
+                if not line:
+                    break
                 
-        except KeyboardInterrupt:
-            break
-        except Exception as e:
-            print(f"Error: {e}", file=sys.stderr)
+                try:
+                    message = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+                
+                await in_flight.acquire()
+                task = asyncio.create_task(process_message(mcp, message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: in_flight.release())
+                    
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                logger.error(f"Error: {e}")
+        
+        # Let in-flight messages finish before the client is closed
+        if tasks:
+            await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
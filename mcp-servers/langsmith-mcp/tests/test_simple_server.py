@@ -0,0 +1,156 @@
+"""Tests for the background run upload queue in simple-server.py."""
+
+import asyncio
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+SERVER_PATH = Path(__file__).resolve().parent.parent / "simple-server.py"
+
+
+class FakeAsyncClient:
+    """Stands in for langsmith.AsyncClient and records uploaded runs."""
+
+    def __init__(self, api_key=None, fail_names=()):
+        self.runs = []
+        self.fail_names = set(fail_names)
+        self.active = 0
+        self.max_active = 0
+        self.runs_at_close = None
+
+    async def create_run(self, **run):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0)
+            if run["name"] in self.fail_names:
+                raise RuntimeError("upload failed")
+            self.runs.append(run)
+        finally:
+            self.active -= 1
+
+    async def aclose(self):
+        self.runs_at_close = len(self.runs)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    spec = importlib.util.spec_from_file_location("simple_server", SERVER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setenv("LANGSMITH_API_KEY", "test-key")
+    monkeypatch.setattr(module, "LANGSMITH_AVAILABLE", True)
+    # langsmith may not be installed, in which case AsyncClient is never bound
+    monkeypatch.setattr(module, "AsyncClient", FakeAsyncClient, raising=False)
+    return module
+
+
+def test_runs_are_uploaded_in_batches(server, monkeypatch):
+    monkeypatch.setattr(server, "RUN_BATCH_SIZE", 10)
+
+    async def scenario():
+        async with server.SimpleLangSmithMCP() as mcp:
+            client = mcp.client
+            for i in range(25):
+                result = await mcp.log_prediction("pup_predictor", {"value": i})
+                assert result["success"] is True
+        return client
+
+    client = asyncio.run(scenario())
+    assert len(client.runs) == 25
+    assert client.max_active <= 10
+
+
+def test_exit_drains_queue_before_closing_client(server):
+    async def scenario():
+        async with server.SimpleLangSmithMCP() as mcp:
+            client = mcp.client
+            for _ in range(5):
+                await mcp.trace_workflow("monthly_forecast", {"company_code": "1000"})
+        return client
+
+    client = asyncio.run(scenario())
+    assert client.runs_at_close == 5
+
+
+def test_exit_with_slow_uploads_is_bounded(server, monkeypatch):
+    monkeypatch.setattr(server, "RUN_BATCH_SIZE", 2)
+    monkeypatch.setattr(server, "RUN_FLUSH_TIMEOUT", 0.2)
+
+    class SlowAsyncClient(FakeAsyncClient):
+        async def create_run(self, **run):
+            await asyncio.sleep(3)
+            self.runs.append(run)
+
+    monkeypatch.setattr(server, "AsyncClient", SlowAsyncClient)
+
+    async def scenario():
+        async with server.SimpleLangSmithMCP() as mcp:
+            client = mcp.client
+            for i in range(6):
+                await mcp.log_prediction("pup_predictor", {"value": i})
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+        return client, loop.time() - started
+
+    client, exit_time = asyncio.run(scenario())
+    assert exit_time < 1
+    assert client.runs_at_close == 0
+
+
+def test_failed_upload_does_not_stop_uploader(server, monkeypatch):
+    monkeypatch.setattr(
+        server, "AsyncClient",
+        lambda api_key=None: FakeAsyncClient(fail_names={"ml_prediction_broken"})
+    )
+
+    async def scenario():
+        async with server.SimpleLangSmithMCP() as mcp:
+            client = mcp.client
+            await mcp.log_prediction("broken", {"value": 0})
+            await asyncio.sleep(server.RUN_BATCH_WAIT * 2)
+            await mcp.log_prediction("pup_predictor", {"value": 1})
+        return client
+
+    # A dead uploader would leave __aexit__ waiting on the queue forever
+    client = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert [run["name"] for run in client.runs] == ["ml_prediction_pup_predictor"]
+
+
+def test_full_queue_reports_error(server, monkeypatch):
+    monkeypatch.setattr(server, "RUN_QUEUE_SIZE", 2)
+
+    async def scenario():
+        # No uploader running, so the queue only fills up
+        mcp = server.SimpleLangSmithMCP()
+        mcp.client = FakeAsyncClient()
+        return [await mcp.log_prediction("pup_predictor", {"value": i}) for i in range(3)]
+
+    results = asyncio.run(scenario())
+    assert [r.get("success") for r in results[:2]] == [True, True]
+    assert "queue is full" in results[2]["error"]
+
+
+def test_without_langsmith_client_reports_error(server, monkeypatch):
+    monkeypatch.delenv("LANGSMITH_API_KEY")
+
+    async def scenario():
+        async with server.SimpleLangSmithMCP() as mcp:
+            return await mcp.log_prediction("pup_predictor", {"value": 1})
+
+    assert asyncio.run(scenario()) == {"error": "LangSmith not available"}
+
+
+def test_stdin_pipe_detection(server, monkeypatch, tmp_path):
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(read_fd) as pipe, os.fdopen(write_fd, "w"):
+        monkeypatch.setattr(server.sys, "stdin", pipe)
+        assert server._stdin_is_pipe() is True
+
+    regular = tmp_path / "input.jsonl"
+    regular.write_text("{}\n")
+    with regular.open() as f:
+        monkeypatch.setattr(server.sys, "stdin", f)
+        assert server._stdin_is_pipe() is False